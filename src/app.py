@@ -1,11 +1,28 @@
-import json
-from flask import Flask, request
+import hashlib
+import time
+import orjson
+from flask import Flask, Response, g, request
+from flask.json.provider import DefaultJSONProvider
 import datetime
 import db
 
 DB = db.DatabaseDriver()
 
+
+class OrJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson, so request.get_json() parses in C"""
+
+    def dumps(self, obj, **kwargs):
+        # The provider contract expects str; Flask interpolates this
+        # into the response body
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = OrJSONProvider(app)
 
 # testing push
 
@@ -13,13 +30,98 @@ def success_response(data,status_code=200):
     """
     Standardized success response
     """
-    return json.dumps(data), status_code
+    return Response(orjson.dumps(data), status=status_code, mimetype="application/json")
 
 def failure_response(description,status_code=500):
     """
     Standardized failure response
     """
-    return json.dumps({"error":description}),status_code
+    return Response(orjson.dumps({"error":description}), status=status_code, mimetype="application/json")
+
+# Tiny in-process TTL cache for hot read endpoints; mutating handlers
+# invalidate the affected keys below
+_response_cache = {}
+
+def cache_get(key):
+    """Return the cached value for key, or None if missing/expired"""
+    entry = _response_cache.get(key)
+    if entry is None:
+        return None
+    expires, value = entry
+    if time.time() >= expires:
+        _response_cache.pop(key, None)
+        return None
+    return value
+
+def cache_set(key, value, timeout):
+    """Cache value under key for timeout seconds"""
+    _response_cache[key] = (time.time() + timeout, value)
+
+def cache_delete(prefix):
+    """Drop every cached entry whose key starts with prefix"""
+    for key in [k for k in _response_cache if k.startswith(prefix)]:
+        _response_cache.pop(key, None)
+
+def cached_success_response(data, cache_control):
+    """
+    Success response with HTTP caching: sets Cache-Control and an ETag,
+    and answers with an empty 304 when the client's If-None-Match
+    still matches the current payload
+    """
+    return cached_payload_response(orjson.dumps(data), cache_control)
+
+def cached_payload_response(payload, cache_control):
+    """
+    Same as cached_success_response, but for an already-serialized
+    JSON payload (bytes)
+    """
+    etag = hashlib.blake2b(payload, digest_size=16).hexdigest()
+    if request.headers.get("If-None-Match") == etag:
+        response = Response(status=304)
+    else:
+        response = Response(payload, mimetype="application/json")
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+def parse_int_field(value, field, minimum=None):
+    """
+    Coerce a request field to an int, enforcing an optional lower bound.
+
+    Returns:
+        tuple: (value, None) on success, (None, failure Response) otherwise
+    """
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None, failure_response(f"'{field}' must be an integer", 400)
+    if minimum is not None and value < minimum:
+        return None, failure_response(f"'{field}' must be >= {minimum}", 400)
+    return value, None
+
+def parse_float_field(value, field, above=None):
+    """
+    Coerce a request field to a float, enforcing an optional exclusive lower bound.
+
+    Returns:
+        tuple: (value, None) on success, (None, failure Response) otherwise
+    """
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None, failure_response(f"'{field}' must be a number", 400)
+    if above is not None and value <= above:
+        return None, failure_response(f"'{field}' must be > {above}", 400)
+    return value, None
+
+@app.before_request
+def stamp_today():
+    """
+    Cache today's date once per request so handlers don't repeatedly
+    hit the clock and re-format the same date string
+    """
+    g.today = datetime.date.today()
+    g.today_str = g.today.isoformat()
 
 @app.route("/")
 def hello_world():
@@ -38,20 +140,24 @@ def get_all_users():
 # GET /consumption - Returns all consumption logs
 @app.route("/consumption", methods=["GET"])
 def get_all_consumption():
-    """Admin endpoint to retrieve all consumption logs"""
-    users = DB.get_all_users()
-    all_consumptions = []
-    for user in users:
-        consumptions = DB.get_consumption_by_user_id(user["id"])
-        all_consumptions.extend(consumptions)
-    return success_response({"all_consumptions": all_consumptions})
+    """Admin endpoint to retrieve all consumption logs, streamed in chunks"""
+    def generate():
+        yield b'{"all_consumptions":['
+        first = True
+        for consumption in DB.iter_all_consumptions():
+            if not first:
+                yield b","
+            yield orjson.dumps(consumption)
+            first = False
+        yield b"]}"
+    return Response(generate(), mimetype="application/json")
 
 
 # POST /beverages - Create a new beverage
 @app.route("/beverages", methods=["POST"])
 def create_beverage():
     """Admin endpoint to create a new beverage"""
-    body = json.loads(request.data)
+    body = request.get_json()
     if body is None:
         return failure_response("Request body must be JSON", 400)
     
@@ -65,15 +171,13 @@ def create_beverage():
     if caffeine_content_mg is None:
         return failure_response("Field 'caffeine_content_mg' is required", 400)
     
-    try:
-        caffeine_content_mg = int(caffeine_content_mg)
-        if caffeine_content_mg < 0:
-            return failure_response("'caffeine_content_mg' must be non-negative", 400)
-    except (TypeError, ValueError):
-        return failure_response("'caffeine_content_mg' must be an integer", 400)
-    
+    caffeine_content_mg, err = parse_int_field(caffeine_content_mg, "caffeine_content_mg", minimum=0)
+    if err:
+        return err
+
     beverage_id = DB.insert_beverage(name, caffeine_content_mg, image_url, category)
     beverage = DB.get_beverage_by_id(beverage_id)
+    cache_delete("beverages")
     return success_response({"beverage": beverage}, 201)
 
 
@@ -81,25 +185,22 @@ def create_beverage():
 @app.route("/beverages/<int:bev_id>", methods=["DELETE"])
 def delete_beverage(bev_id):
     """Admin endpoint to delete a beverage"""
-    existing = DB.get_beverage_by_id(bev_id)
-    if not existing:
+    deleted = DB.delete_beverage_by_id(bev_id)
+    if deleted is None:
         return failure_response("Beverage not found", 404)
-    DB.delete_beverage_by_id(bev_id)
-    return success_response({"beverage_deleted": existing})
+    cache_delete("beverages")
+    cache_delete("stats:")
+    return success_response({"beverage_deleted": deleted})
 
 
 # PUT /beverages/<bev_id> - Update a beverage
 @app.route("/beverages/<int:bev_id>", methods=["PUT"])
 def update_beverage(bev_id):
     """Admin endpoint to update beverage details"""
-    existing = DB.get_beverage_by_id(bev_id)
-    if not existing:
-        return failure_response("Beverage not found", 404)
-    
-    body = request
+    body = request.get_json()
     if body is None:
         return failure_response("Request body must be JSON", 400)
-    
+
     name = body.get("name")
     caffeine_content_mg = body.get("caffeine_content_mg")
     image_url = body.get("image_url")
@@ -108,16 +209,17 @@ def update_beverage(bev_id):
     if not name:
         return failure_response("Field 'name' cannot be empty", 400)
 
-    try:
-        caffeine_content_mg = int(caffeine_content_mg)
-        if caffeine_content_mg < 0:
-            return failure_response("'caffeine_content_mg' must be non-negative", 400)
-    except (TypeError, ValueError):
-        return failure_response("'caffeine_content_mg' must be an integer", 400)
-    
-    DB.update_beverage_by_id(bev_id, name, caffeine_content_mg, image_url, category)
-    updated_beverage = DB.get_beverage_by_id(bev_id)
+    caffeine_content_mg, err = parse_int_field(caffeine_content_mg, "caffeine_content_mg", minimum=0)
+    if err:
+        return err
+
+    # UPDATE ... RETURNING checks existence, mutates, and reads back at once
+    updated_beverage = DB.update_beverage_returning(bev_id, name, caffeine_content_mg, image_url, category)
+    if updated_beverage is None:
+        return failure_response("Beverage not found", 404)
 
+    cache_delete("beverages")
+    cache_delete("stats:")
     return success_response({"beverage_updated": updated_beverage})
 
 # ==================== ADMIN AND USER FRIENDLY ROUTES ====================
@@ -126,8 +228,13 @@ def update_beverage(bev_id):
 @app.route("/beverages", methods=["GET"])
 def get_beverages():
     """Public endpoint to retrieve all available beverages"""
-    beverages = DB.get_all_beverages()
-    return success_response({"beverages": beverages})
+    payload = cache_get("beverages")
+    if payload is None:
+        # SQLite emits the JSON array itself; only the envelope is
+        # spliced on in Python
+        payload = b'{"beverages":' + DB.get_all_beverages_json().encode() + b"}"
+        cache_set("beverages", payload, 300)
+    return cached_payload_response(payload, "public, max-age=300")
 
 
 # POST /users - Create a new user account
@@ -157,20 +264,14 @@ def create_user():
     if missing:
         return failure_response(f"Missing required field(s): {', '.join(missing)}", 400)
 
-    try:
-        daily_caffeine_limit = int(daily_caffeine_limit)
-        if daily_caffeine_limit <= 0:
-            return failure_response("'daily_caffeine_limit' must be > 0", 400)
-    except (TypeError, ValueError):
-        return failure_response("'daily_caffeine_limit' must be an integer", 400)
+    daily_caffeine_limit, err = parse_int_field(daily_caffeine_limit, "daily_caffeine_limit", minimum=1)
+    if err:
+        return err
+
+    weight_lbs, err = parse_float_field(weight_lbs, "weight_lbs", above=0)
+    if err:
+        return err
 
-    try:
-        weight_lbs = float(weight_lbs)
-        if weight_lbs <= 0:
-            return failure_response("'weight_lbs' must be > 0", 400)
-    except (TypeError, ValueError):
-        return failure_response("'weight_lbs' must be a number", 400)
-    
     user_id = DB.insert_user(username, email, password_hash, daily_caffeine_limit, weight_lbs)
     user = DB.get_user_by_id(user_id)
 
@@ -181,21 +282,22 @@ def create_user():
 @app.route("/users/<int:user_id>/consumption/today", methods=["GET"])
 def get_consumption_today(user_id):
     """Get caffeine consumption summary for today"""
-    today = datetime.date.today().strftime("%Y-%m-%d")
-    consumptions = DB.get_consumption_by_user_and_date(user_id, today)
-    
+    today = g.today_str
+
+    # One JOINed query gives the beverage details alongside each row
+    consumptions = DB.get_consumption_breakdown_by_user_and_date(user_id, today)
+
     total_caffeine = 0
     breakdown = []
     for consumption in consumptions:
-        beverage = DB.get_beverage_by_id(consumption["beverage_id"])
-        caffeine_amount = beverage["caffeine_content_mg"] * consumption["serving_count"]
+        caffeine_amount = consumption["caffeine_content_mg"] * consumption["serving_count"]
         total_caffeine += caffeine_amount
         breakdown.append({
-            "beverage": beverage["name"],
+            "beverage": consumption["name"],
             "servings": consumption["serving_count"],
             "caffeine_mg": caffeine_amount
         })
-    
+
     return success_response({
         "date": today,
         "total_caffeine_mg": total_caffeine,
@@ -207,20 +309,14 @@ def get_consumption_today(user_id):
 @app.route("/users/<int:user_id>/consumption/weekly", methods=["GET"])
 def get_consumption_weekly(user_id):
     """Get day-by-day caffeine consumption summary for the past 7 days"""
-    weekly_summary = {}
-    
-    # Iterate through the past 7 days
-    for i in range(7):
-        date = (datetime.date.today() - datetime.timedelta(days=i)).strftime("%Y-%m-%d")
-        consumptions = DB.get_consumption_by_user_and_date(user_id, date)
-        
-        total_caffeine = 0
-        for consumption in consumptions:
-            beverage = DB.get_beverage_by_id(consumption["beverage_id"])
-            total_caffeine += beverage["caffeine_content_mg"] * consumption["serving_count"]
-        
-        weekly_summary[date] = total_caffeine
-    
+    start = g.today - datetime.timedelta(days=6)
+
+    # Start every day of the week at 0, then overwrite with the grouped totals
+    weekly_summary = {
+        (g.today - datetime.timedelta(days=i)).isoformat(): 0 for i in range(7)
+    }
+    weekly_summary.update(DB.get_weekly_totals(user_id, start.isoformat()))
+
     return success_response(weekly_summary)
 
 
@@ -228,26 +324,25 @@ def get_consumption_weekly(user_id):
 @app.route("/users/<int:user_id>/stats", methods=["GET"])
 def get_user_stats(user_id):
     """Get user's caffeine stats including daily total, limit, and percentage"""
-    user = DB.get_user_by_id(user_id)
-    today = datetime.date.today().strftime("%Y-%m-%d")
-    consumptions = DB.get_consumption_by_user_and_date(user_id, today)
-    
-    # Calculate total caffeine consumed today
-    total_caffeine = 0
-    for consumption in consumptions:
-        beverage = DB.get_beverage_by_id(consumption["beverage_id"])
-        total_caffeine += beverage["caffeine_content_mg"] * consumption["serving_count"]
-    
-    daily_limit = user["daily_caffeine_limit"]
-    percentage = (total_caffeine / daily_limit * 100) if daily_limit > 0 else 0
-    
-    return success_response({
-        "user_id": user_id,
-        "daily_total_caffeine_mg": total_caffeine,
-        "daily_limit_mg": daily_limit,
-        "percentage_of_limit": round(percentage, 2),
-        "remaining_mg": max(0, daily_limit - total_caffeine)
-    })
+    stats = cache_get(f"stats:{user_id}")
+    if stats is None:
+        user = DB.get_user_by_id(user_id)
+        today = g.today_str
+        # Let SQLite compute the day's total as a single scalar
+        total_caffeine = DB.get_daily_total_caffeine(user_id, today)
+
+        daily_limit = user["daily_caffeine_limit"]
+        percentage = (total_caffeine / daily_limit * 100) if daily_limit > 0 else 0
+
+        stats = {
+            "user_id": user_id,
+            "daily_total_caffeine_mg": total_caffeine,
+            "daily_limit_mg": daily_limit,
+            "percentage_of_limit": round(percentage, 2),
+            "remaining_mg": max(0, daily_limit - total_caffeine)
+        }
+        cache_set(f"stats:{user_id}", stats, 30)
+    return cached_success_response(stats, "private, max-age=30")
 
 
 # POST /consumptions - Log a beverage consumption
@@ -255,43 +350,89 @@ def get_user_stats(user_id):
 def log_consumption(user_id):
     """Log a new beverage consumption"""
     body = request.get_json()
-    user = DB.get_user_by_id(user_id)
-
-    if not user:
-        return failure_response("User not found", 404)
     if body is None:
         return failure_response("Request body must be JSON", 400)
-    
+
     beverage_id = body.get("beverage_id")
     serving_count = body.get("serving_count", 1)
+    idempotency_key = body.get("idempotency_key")
 
     if beverage_id is None:
         return failure_response("'beverage_id' is required", 400)
-    
-    try:
-        beverage_id = int(beverage_id)
-        serving_count = int(serving_count)
-    except (TypeError, ValueError):
-        return failure_response("'beverage_id' and 'serving_count' must be integers", 400)
-    if serving_count <= 0:
-        return failure_response("'serving_count' must be >= 1", 400)
-    if not DB.get_beverage_by_id(beverage_id):
+    if idempotency_key is not None and not isinstance(idempotency_key, str):
+        return failure_response("'idempotency_key' must be a string", 400)
+
+    beverage_id, err = parse_int_field(beverage_id, "beverage_id")
+    if err:
+        return err
+    serving_count, err = parse_int_field(serving_count, "serving_count", minimum=1)
+    if err:
+        return err
+
+    # Validate both foreign keys with a single query
+    user_exists, beverage_exists = DB.check_user_and_beverage(user_id, beverage_id)
+    if not user_exists:
+        return failure_response("User not found", 404)
+    if not beverage_exists:
         return failure_response("Beverage not found", 404)
-    
-    consumption_id = DB.insert_consumption(user_id, beverage_id, serving_count)
+
+    consumption_id = DB.insert_consumption(user_id, beverage_id, serving_count, idempotency_key)
+    if consumption_id is None:
+        return failure_response("Consumption with this idempotency key already logged", 409)
     consumption = DB.get_consumption_by_id(consumption_id)
+    cache_delete(f"stats:{user_id}")
     return success_response({"consumption": consumption}, 201)
 
 
+# POST /consumptions/bulk - Log several consumptions at once
+@app.route("/users/<int:user_id>/consumptions/bulk", methods=["POST"])
+def log_consumptions_bulk(user_id):
+    """Log several beverage consumptions in one transaction"""
+    body = request.get_json()
+    if body is None:
+        return failure_response("Request body must be JSON", 400)
+
+    entries = body.get("consumptions")
+    if not isinstance(entries, list) or not entries:
+        return failure_response("'consumptions' must be a non-empty list", 400)
+    if not DB.get_user_by_id(user_id):
+        return failure_response("User not found", 404)
+
+    rows = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            return failure_response("Each consumption must be an object", 400)
+        if entry.get("beverage_id") is None:
+            return failure_response("'beverage_id' is required", 400)
+        beverage_id, err = parse_int_field(entry.get("beverage_id"), "beverage_id")
+        if err:
+            return err
+        serving_count, err = parse_int_field(entry.get("serving_count", 1), "serving_count", minimum=1)
+        if err:
+            return err
+        idempotency_key = entry.get("idempotency_key")
+        if idempotency_key is not None and not isinstance(idempotency_key, str):
+            return failure_response("'idempotency_key' must be a string", 400)
+        rows.append((user_id, beverage_id, serving_count, idempotency_key))
+
+    # One batch fetch validates every referenced beverage
+    beverages = DB.get_beverages_by_ids(row[1] for row in rows)
+    if {row[1] for row in rows} - set(beverages):
+        return failure_response("Beverage not found", 404)
+
+    inserted = DB.bulk_insert_consumptions(rows)
+    cache_delete(f"stats:{user_id}")
+    return success_response(
+        {"consumptions_logged": inserted, "duplicates_skipped": len(rows) - inserted}, 201
+    )
+
+
 # DELETE /users/<user_id> - Delete user account
 @app.route("/users/<int:user_id>", methods=["DELETE"])
 def delete_user(user_id):
     """Delete a user account and all associated data"""
-    consumptions = DB.get_consumption_by_user_id(user_id)
-    for consumption in consumptions:
-        DB.delete_consumption_by_id(consumption["id"])
-    
-    DB.delete_user_by_id(user_id)
+    DB.delete_user_cascade(user_id)
+    cache_delete(f"stats:{user_id}")
     return success_response({"user_deleted": user_id})
 
 
@@ -301,11 +442,11 @@ def delete_consumption(user_id, log_id):
     """Remove a consumption log entry"""
     if not DB.get_user_by_id(user_id):
         return failure_response("User not found", 404)
-    consumption = DB.get_consumption_by_id(log_id)
-    if not consumption:
+    deleted = DB.delete_consumption_by_id(log_id)
+    if deleted is None:
         return failure_response("Consumption entry not found", 404)
-    DB.delete_consumption_by_id(log_id)
-    return success_response({"consumption_deleted": consumption})
+    cache_delete(f"stats:{user_id}")
+    return success_response({"consumption_deleted": deleted})
 
 
 # PUT /users/<user_id>/limit - Update daily caffeine limit
@@ -320,19 +461,15 @@ def update_caffeine_limit(user_id):
     if new_limit is None:
         return failure_response("'daily_caffeine_limit' is required", 400)
     
-    try:
-        new_limit = int(new_limit)
-        if new_limit <= 0:
-            return failure_response("'daily_caffeine_limit' must be > 0", 400)
-    except (TypeError, ValueError):
-        return failure_response("'daily_caffeine_limit' must be an integer", 400)
-    
-    user = DB.get_user_by_id(user_id)
-    if not user:
-        return failure_response("User not found", 404)
+    new_limit, err = parse_int_field(new_limit, "daily_caffeine_limit", minimum=1)
+    if err:
+        return err
 
-    DB.update_user_by_id(user_id, user["username"], user["email"], user["password_hash"], new_limit, user["weight_lbs"])
-    updated_user = DB.get_user_by_id(user_id)
+    # Single targeted UPDATE ... RETURNING instead of read-modify-write
+    updated_user = DB.update_user_limit(user_id, new_limit)
+    if updated_user is None:
+        return failure_response("User not found", 404)
+    cache_delete(f"stats:{user_id}")
     return success_response({"user_updated": updated_user})
 
 
@@ -351,12 +488,9 @@ def update_consumption(user_id, log_id):
     if new_serving_count is None:
         return failure_response("'serving_count' is required", 400)
     
-    try:
-        new_serving_count = int(new_serving_count)
-        if new_serving_count <= 0:
-            return failure_response("'serving_count' must be >= 1", 400)
-    except (TypeError, ValueError):
-        return failure_response("'serving_count' must be an integer", 400)
+    new_serving_count, err = parse_int_field(new_serving_count, "serving_count", minimum=1)
+    if err:
+        return err
     
     consumption = DB.get_consumption_by_id(log_id)
     if not consumption:
@@ -367,6 +501,7 @@ def update_consumption(user_id, log_id):
     
     DB.update_consumption_by_id(log_id, new_serving_count)
     updated_consumption = DB.get_consumption_by_id(log_id)
+    cache_delete(f"stats:{user_id}")
     return success_response({"consumption_updated": updated_consumption})
 
 
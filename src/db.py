@@ -1,18 +1,122 @@
-import os
+import contextlib
 import sqlite3
+import threading
+import time
 
-# From: https://goo.gl/YzypOI
+# From: https://goo.gl/YzypOI, reduced to a single closure slot since the
+# decorator caches exactly one class's instance anyway
 def singleton(cls):
-    instances = {}
+    instance = None
 
     def getinstance():
-        if cls not in instances:
-            instances[cls] = cls()
-        return instances[cls]
+        nonlocal instance
+        if instance is None:
+            instance = cls()
+        return instance
 
     return getinstance
 
 
+def _dict_row(cursor, row):
+    """
+    Row factory producing one dict per row.
+
+    cursor.description yields each column name string once per statement,
+    so every row reuses the same interned key objects instead of
+    re-creating them per row as the old hand-built dict literals did.
+    """
+    return {desc[0]: value for desc, value in zip(cursor.description, row)}
+
+
+# Parameterized statements are hoisted to module level so the same string
+# objects hit sqlite3's prepared-statement cache on every call
+# Bump when the DDL below changes so create_tables reapplies it
+SCHEMA_VERSION = 3
+
+# Cached beverage rows expire after this many seconds. Mutations only evict
+# from the worker process that served them, so under multiple gunicorn
+# workers the TTL is what bounds staleness in the others
+BEVERAGE_CACHE_TTL = 300
+
+SQL_GET_ALL_USERS = "SELECT id, username, email, password_hash, created_at, daily_caffeine_limit, weight_lbs FROM users;"
+SQL_INSERT_USER = "INSERT INTO users (username, email, password_hash, daily_caffeine_limit, weight_lbs) VALUES (?, ?, ?, ?, ?);"
+SQL_GET_USER_BY_ID = "SELECT id, username, email, password_hash, created_at, daily_caffeine_limit, weight_lbs FROM users WHERE id = ?;"
+SQL_GET_USER_BY_USERNAME = "SELECT id, username, email, password_hash, created_at, daily_caffeine_limit, weight_lbs FROM users WHERE username = ?;"
+SQL_GET_CREDENTIALS_BY_USERNAME = "SELECT id, password_hash, daily_caffeine_limit FROM users WHERE username = ?;"
+SQL_UPDATE_USER_BY_ID = """
+    UPDATE users
+    SET username = ?, email = ?, password_hash = ?, daily_caffeine_limit = ?, weight_lbs = ?
+    WHERE id = ?;
+"""
+SQL_UPDATE_USER_LIMIT = "UPDATE users SET daily_caffeine_limit = ? WHERE id = ? RETURNING id, username, email, password_hash, created_at, daily_caffeine_limit, weight_lbs;"
+SQL_DELETE_USER_BY_ID = "DELETE FROM users WHERE id = ?;"
+
+SQL_GET_ALL_BEVERAGES = "SELECT id, name, caffeine_content_mg, image_url, category FROM beverages;"
+# JSON is assembled inside SQLite, so the whole catalog crosses into
+# Python as one string instead of N rows
+SQL_GET_ALL_BEVERAGES_JSON = """
+    SELECT COALESCE(json_group_array(json_object(
+               'id', id,
+               'name', name,
+               'caffeine_content_mg', caffeine_content_mg,
+               'image_url', image_url,
+               'category', category)), '[]') AS payload
+    FROM beverages;
+"""
+SQL_INSERT_BEVERAGE = "INSERT INTO beverages (name, caffeine_content_mg, image_url, category) VALUES (?, ?, ?, ?);"
+SQL_GET_BEVERAGE_BY_ID = "SELECT id, name, caffeine_content_mg, image_url, category FROM beverages WHERE id = ?;"
+SQL_UPDATE_BEVERAGE_BY_ID = """
+    UPDATE beverages
+    SET name = ?, caffeine_content_mg = ?, image_url = ?, category = ?
+    WHERE id = ?;
+"""
+SQL_UPDATE_BEVERAGE_RETURNING = """
+    UPDATE beverages
+    SET name = ?, caffeine_content_mg = ?, image_url = ?, category = ?
+    WHERE id = ?
+    RETURNING id, name, caffeine_content_mg, image_url, category;
+"""
+SQL_DELETE_BEVERAGE_BY_ID = "DELETE FROM beverages WHERE id = ? RETURNING id, name, caffeine_content_mg, image_url, category;"
+
+SQL_CHECK_USER_AND_BEVERAGE = """
+    SELECT (SELECT 1 FROM users WHERE id = ?) AS u,
+           (SELECT 1 FROM beverages WHERE id = ?) AS b;
+"""
+# OR IGNORE makes replayed logs (same user and client-supplied idempotency
+# key) dedup inside the B-tree via uq_consumption_log_idem, with no SELECT
+# first; rows logged without a key always insert (NULLs never collide)
+SQL_INSERT_CONSUMPTION = "INSERT OR IGNORE INTO consumption_log (user_id, beverage_id, serving_count, idempotency_key) VALUES (?, ?, ?, ?);"
+SQL_GET_ALL_CONSUMPTIONS = "SELECT id, user_id, beverage_id, consumption_time, serving_count FROM consumption_log;"
+SQL_GET_CONSUMPTION_BY_USER = "SELECT id, user_id, beverage_id, consumption_time, serving_count FROM consumption_log WHERE user_id = ?;"
+# Date filters use half-open ranges on consumption_time (never DATE(column))
+# so the (user_id, consumption_time) index stays usable
+SQL_GET_CONSUMPTION_BY_USER_AND_DATE = "SELECT id, user_id, beverage_id, consumption_time, serving_count FROM consumption_log WHERE user_id = ? AND consumption_time >= ? AND consumption_time < DATE(?, '+1 day');"
+SQL_GET_WEEKLY_TOTALS = """
+    SELECT DATE(c.consumption_time) AS day,
+           COALESCE(SUM(b.caffeine_content_mg * c.serving_count), 0) AS total
+    FROM consumption_log c JOIN beverages b ON b.id = c.beverage_id
+    WHERE c.user_id = ? AND c.consumption_time >= ?
+    GROUP BY day;
+"""
+SQL_GET_CONSUMPTION_BREAKDOWN = """
+    SELECT b.name, c.serving_count, b.caffeine_content_mg
+    FROM consumption_log c JOIN beverages b ON b.id = c.beverage_id
+    WHERE c.user_id = ? AND c.consumption_time >= ? AND c.consumption_time < DATE(?, '+1 day');
+"""
+SQL_GET_DAILY_TOTAL_CAFFEINE = """
+    SELECT COALESCE(SUM(b.caffeine_content_mg * c.serving_count), 0) AS total
+    FROM consumption_log c JOIN beverages b ON b.id = c.beverage_id
+    WHERE c.user_id = ? AND c.consumption_time >= ? AND c.consumption_time < DATE(?, '+1 day');
+"""
+SQL_GET_CONSUMPTION_BY_ID = "SELECT id, user_id, beverage_id, consumption_time, serving_count FROM consumption_log WHERE id = ?;"
+SQL_UPDATE_CONSUMPTION_BY_ID = "UPDATE consumption_log SET serving_count = ? WHERE id = ?;"
+SQL_DELETE_CONSUMPTIONS_BY_USER = "DELETE FROM consumption_log WHERE user_id = ?;"
+SQL_DELETE_CONSUMPTION_BY_ID = "DELETE FROM consumption_log WHERE id = ? RETURNING id, user_id, beverage_id, consumption_time, serving_count;"
+
+
+# Only <=1 instance of the database driver
+# exists within the app at all times
+@singleton
 class DatabaseDriver(object):
     """
     Database driver for the Caffeine Tracker app.
@@ -20,118 +124,176 @@ class DatabaseDriver(object):
 
     """
 
+    __slots__ = ("_local", "_beverage_cache")
+
     def __init__(self):
         """
         Initialize the database driver.
-        Creates a connection to the SQLite database and initializes all tables.
+        Opens a per-thread connection to the SQLite database and initializes
+        all tables.
+        """
+        # One connection per worker thread instead of a single shared one:
+        # with WAL enabled, readers on separate connections no longer queue
+        # behind each other or behind a committing writer
+        self._local = threading.local()
+        # Beverages are a small, read-mostly catalog, so cache rows in
+        # memory with a TTL and evict on any beverage mutation
+        self._beverage_cache = {}
+        self.create_tables()
+        self.refresh_beverage_cache()
+
+    @property
+    def conn(self):
+        """
+        The calling thread's SQLite connection, opened lazily on first use.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect("tables.db", cached_statements=256)
+            # Rows materialize as dicts directly, keyed by column names
+            # interned once per statement from cursor.description
+            conn.row_factory = _dict_row
+            # WAL lets readers proceed while a writer commits, and NORMAL
+            # drops the per-commit fsync to one per WAL checkpoint
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute("PRAGMA temp_store=MEMORY;")
+            # 64 MiB page cache plus a 256 MiB mmap window keep the whole
+            # database in memory for reads on any realistic dataset here
+            conn.execute("PRAGMA cache_size=-65536;")
+            conn.execute("PRAGMA mmap_size=268435456;")
+            # With several threads writing on their own connections, wait
+            # for the write lock instead of failing fast with SQLITE_BUSY
+            conn.execute("PRAGMA busy_timeout=5000;")
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def transaction(self):
         """
-        self.conn = sqlite3.connect(
-            "tables.db", check_same_thread=False
-        )
-        self.create_users_table()
-        self.create_beverages_table()
-        self.create_consumption_log_table()
+        Run several statements in one transaction with a single commit.
 
-    def create_users_table(self):
+        Yields the calling thread's connection; the transaction commits on
+        normal exit and rolls back if the block raises, so multi-statement
+        flows pay one fsync instead of one per statement.
         """
-        Create the users table if it doesn't already exist.
-        
-        Table schema:
-        - id: Primary key (auto-increment)
-        - username: Unique username (required)
-        - email: User's email address (required)
-        - password_hash: Hashed password (required)
-        - created_at: Account creation timestamp
-        - daily_caffeine_limit: Daily caffeine limit in mg (required)
-        - weight_lbs: User's weight in pounds (default: 160.0)
-        """
-        try:
-            self.conn.execute("""
-                CREATE TABLE users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT NOT NULL UNIQUE,
-                    email TEXT NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    daily_caffeine_limit INTEGER NOT NULL,
-                    weight_lbs REAL DEFAULT 160.0
-                );
-            """)
-        except Exception as e:
-            print(e)
-
-    def create_beverages_table(self):
-        """
-        Create the beverages table if it doesn't already exist.
-        
-        Table schema:
-        - id: Primary key (auto-increment)
-        - name: Beverage name (required)
-        - caffeine_content_mg: Caffeine content in milligrams (required)
-        - image_url: URL to beverage image (optional)
-        - category: Beverage category (optional)
-        """
-        try:
-            self.conn.execute("""
-                CREATE TABLE beverages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    caffeine_content_mg INTEGER NOT NULL,
-                    image_url TEXT,
-                    category TEXT
-                );
-            """)
-        except Exception as e:
-            print(e)
-
-    def create_consumption_log_table(self):
-        """
-        Create the consumption_log table if it doesn't already exist.
-        
-        Table schema:
-        - id: Primary key (auto-increment)
-        - user_id: Foreign key to users table (required)
-        - beverage_id: Foreign key to beverages table (required)
-        - consumption_time: Timestamp of consumption
-        - serving_count: Number of servings consumed (default: 1)
-        """
-        try:
-            self.conn.execute("""
-                CREATE TABLE consumption_log (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    beverage_id INTEGER NOT NULL,
-                    consumption_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    serving_count INTEGER DEFAULT 1,
-                    FOREIGN KEY (user_id) REFERENCES users(id),
-                    FOREIGN KEY (beverage_id) REFERENCES beverages(id)
-                );
-            """)
-        except Exception as e:
-            print(e)
+        with self.conn as conn:
+            yield conn
+
+    def create_tables(self):
+        """
+        Create the schema (tables and indexes) if this database is new.
+
+        All DDL runs as one executescript behind a PRAGMA user_version
+        fence, so warm restarts skip the statements entirely instead of
+        re-checking each CREATE ... IF NOT EXISTS against the schema.
+
+        Table schemas:
+        - users: id (PK), username (unique), email, password_hash,
+          created_at, daily_caffeine_limit, weight_lbs (default 160.0)
+        - beverages: id (PK), name, caffeine_content_mg, image_url,
+          category
+        - consumption_log: id (PK), user_id (FK), beverage_id (FK),
+          consumption_time, serving_count (default 1), idempotency_key
+        """
+        version = self.conn.execute("PRAGMA user_version;").fetchone()["user_version"]
+        if version >= SCHEMA_VERSION:
+            return
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL UNIQUE,
+                email TEXT NOT NULL,
+                password_hash TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                daily_caffeine_limit INTEGER NOT NULL,
+                weight_lbs REAL DEFAULT 160.0
+            );
+            CREATE TABLE IF NOT EXISTS beverages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                caffeine_content_mg INTEGER NOT NULL,
+                image_url TEXT,
+                category TEXT
+            );
+            CREATE TABLE IF NOT EXISTS consumption_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                beverage_id INTEGER NOT NULL,
+                consumption_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                serving_count INTEGER DEFAULT 1,
+                idempotency_key TEXT,
+                FOREIGN KEY (user_id) REFERENCES users(id),
+                FOREIGN KEY (beverage_id) REFERENCES beverages(id)
+            );
+        """)
+        # Databases created before revision 3 predate idempotency_key and
+        # ALTER TABLE has no IF NOT EXISTS, so probe the live schema
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(consumption_log);")}
+        if "idempotency_key" not in columns:
+            self.conn.execute("ALTER TABLE consumption_log ADD COLUMN idempotency_key TEXT;")
+        self.conn.executescript(f"""
+            -- Every hot query filters by user_id (often with a date) or
+            -- joins on beverage_id, so index those to avoid full scans
+            CREATE INDEX IF NOT EXISTS idx_consumption_log_user_time
+            ON consumption_log(user_id, consumption_time);
+            CREATE INDEX IF NOT EXISTS idx_consumption_log_beverage
+            ON consumption_log(beverage_id);
+            -- Revision 2's natural key collided with pre-existing rows and
+            -- with legitimate same-second logs; replay dedup now keys on a
+            -- client-supplied token, and NULL keys never collide
+            DROP INDEX IF EXISTS uq_consumption_log_natural;
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_consumption_log_idem
+            ON consumption_log(user_id, idempotency_key);
+            PRAGMA user_version = {SCHEMA_VERSION};
+        """)
+
+    def iter_users(self):
+        """
+        Iterate over all users straight from the cursor, without
+        materializing the whole table in memory.
+
+        Yields:
+            dict: A dictionary containing user information:
+                  id, username, email, password_hash, created_at,
+                  daily_caffeine_limit, weight_lbs
+        """
+        cursor = self.conn.execute(SQL_GET_ALL_USERS)
+        # fetchmany pulls rows through the C fetch path in blocks, paying
+        # the Python iteration overhead once per batch rather than per row
+        while True:
+            rows = cursor.fetchmany(512)
+            if not rows:
+                break
+            yield from rows
 
     def get_all_users(self):
         """
         Retrieve all users from the database.
-        
+
         Returns:
             list: A list of dictionaries, each containing user information:
-                  id, username, email, password_hash, created_at, 
+                  id, username, email, password_hash, created_at,
                   daily_caffeine_limit, weight_lbs
         """
-        cursor = self.conn.execute("SELECT * FROM users;")
-        users = []
-        for row in cursor:
-            users.append({
-                "id": row[0],
-                "username": row[1],
-                "email": row[2],
-                "password_hash": row[3],
-                "created_at": row[4],
-                "daily_caffeine_limit": row[5],
-                "weight_lbs": row[6]
-            })
-        return users
+        return list(self.iter_users())
+
+    def get_credentials_by_username(self, username):
+        """
+        Retrieve only the columns a credential check needs for a user.
+
+        The UNIQUE constraint on username already gives a B-tree lookup;
+        projecting just these columns skips copying the rest of the row
+        on what would be a per-login hot path.
+
+        Args:
+            username (str): The username to look up
+
+        Returns:
+            dict: id, password_hash and daily_caffeine_limit for the user,
+                  or None if the user doesn't exist
+        """
+        return self.conn.execute(SQL_GET_CREDENTIALS_BY_USERNAME, (username,)).fetchone()
 
     def insert_user(self, username, email, password_hash, daily_caffeine_limit, weight_lbs=160.0):
         """
@@ -148,7 +310,7 @@ class DatabaseDriver(object):
             int: The ID of the newly inserted user
         """
         cursor = self.conn.cursor()
-        cursor.execute("INSERT INTO users (username, email, password_hash, daily_caffeine_limit, weight_lbs) VALUES (?, ?, ?, ?, ?);",
+        cursor.execute(SQL_INSERT_USER,
             (username, email, password_hash, daily_caffeine_limit, weight_lbs))
         self.conn.commit()
         return cursor.lastrowid
@@ -164,18 +326,7 @@ class DatabaseDriver(object):
             dict or None: A dictionary containing user information if found,
                          None otherwise
         """
-        cursor = self.conn.execute("SELECT * FROM users WHERE id = ?;", (id,))
-        for row in cursor:
-            return {
-                "id": row[0],
-                "username": row[1],
-                "email": row[2],
-                "password_hash": row[3],
-                "created_at": row[4],
-                "daily_caffeine_limit": row[5],
-                "weight_lbs": row[6]
-            }
-        return None
+        return self.conn.execute(SQL_GET_USER_BY_ID, (id,)).fetchone()
 
     def get_user_by_username(self, username):
         """
@@ -188,18 +339,7 @@ class DatabaseDriver(object):
             dict or None: A dictionary containing user information if found,
                          None otherwise
         """
-        cursor = self.conn.execute("SELECT * FROM users WHERE username = ?;", (username,))
-        for row in cursor:
-            return {
-                "id": row[0],
-                "username": row[1],
-                "email": row[2],
-                "password_hash": row[3],
-                "created_at": row[4],
-                "daily_caffeine_limit": row[5],
-                "weight_lbs": row[6]
-            }
-        return None
+        return self.conn.execute(SQL_GET_USER_BY_USERNAME, (username,)).fetchone()
 
     def update_user_by_id(self, id, username, email, password_hash, daily_caffeine_limit, weight_lbs=160.0):
         """
@@ -213,12 +353,29 @@ class DatabaseDriver(object):
             daily_caffeine_limit (int): New daily caffeine limit in mg
             weight_lbs (float, optional): New weight in pounds. Defaults to 160.0
         """
-        self.conn.execute("""
-            UPDATE users
-            SET username = ?, email = ?, password_hash = ?, daily_caffeine_limit = ?, weight_lbs = ?
-            WHERE id = ?;
-        """, (username, email, password_hash, daily_caffeine_limit, weight_lbs, id))
+        self.conn.execute(SQL_UPDATE_USER_BY_ID,
+            (username, email, password_hash, daily_caffeine_limit, weight_lbs, id))
+        self.conn.commit()
+
+    def update_user_limit(self, id, daily_caffeine_limit):
+        """
+        Update only a user's daily caffeine limit and return the updated row.
+        Uses UPDATE ... RETURNING so the existence check, mutation, and
+        read-back happen in a single round-trip.
+
+        Args:
+            id (int): The user's ID
+            daily_caffeine_limit (int): New daily caffeine limit in mg
+
+        Returns:
+            dict or None: The updated user if found, None otherwise
+        """
+        cursor = self.conn.execute(SQL_UPDATE_USER_LIMIT, (daily_caffeine_limit, id))
+        row = cursor.fetchone()
         self.conn.commit()
+        if row is None:
+            return None
+        return row
 
     def delete_user_by_id(self, id):
         """
@@ -227,9 +384,53 @@ class DatabaseDriver(object):
         Args:
             id (int): The user's ID to delete
         """
-        self.conn.execute("DELETE FROM users WHERE id = ?;", (id,))
+        self.conn.execute(SQL_DELETE_USER_BY_ID, (id,))
         self.conn.commit()
 
+    def delete_user_cascade(self, id):
+        """
+        Delete a user and all of their consumption log entries atomically.
+        Both DELETEs run inside one transaction, so only a single commit
+        (and fsync) happens.
+
+        Args:
+            id (int): The user's ID to delete
+        """
+        with self.transaction() as conn:
+            conn.execute(SQL_DELETE_CONSUMPTIONS_BY_USER, (id,))
+            conn.execute(SQL_DELETE_USER_BY_ID, (id,))
+
+    def _beverage_cache_get(self, id):
+        """
+        Return the cached beverage for id, or None if missing or expired.
+        """
+        entry = self._beverage_cache.get(id)
+        if entry is None:
+            return None
+        expires, beverage = entry
+        if time.time() >= expires:
+            self._beverage_cache.pop(id, None)
+            return None
+        return beverage
+
+    def _beverage_cache_put(self, beverage):
+        """
+        Cache a beverage row under its id for BEVERAGE_CACHE_TTL seconds.
+        """
+        self._beverage_cache[beverage["id"]] = (time.time() + BEVERAGE_CACHE_TTL, beverage)
+
+    def refresh_beverage_cache(self):
+        """
+        Reload the whole beverages table into the in-memory cache.
+
+        The catalog is small and read on every consumption computation, so
+        preloading it at boot means per-id lookups never touch SQLite until
+        a beverage is mutated or its entry expires.
+        """
+        cursor = self.conn.execute(SQL_GET_ALL_BEVERAGES)
+        expires = time.time() + BEVERAGE_CACHE_TTL
+        self._beverage_cache = {row["id"]: (expires, row) for row in cursor}
+
     def get_all_beverages(self):
         """
         Retrieve all beverages from the database.
@@ -238,18 +439,26 @@ class DatabaseDriver(object):
             list: A list of dictionaries, each containing beverage information:
                   id, name, caffeine_content_mg, image_url, category
         """
-        cursor = self.conn.execute("SELECT * FROM beverages;")
-        beverages = []
-        for row in cursor:
-            beverages.append({
-                "id": row[0],
-                "name": row[1],
-                "caffeine_content_mg": row[2],
-                "image_url": row[3],
-                "category": row[4]
-            })
+        cursor = self.conn.execute(SQL_GET_ALL_BEVERAGES)
+        beverages = cursor.fetchall()
+        # Prime the per-id cache in bulk while we have the rows anyway
+        expires = time.time() + BEVERAGE_CACHE_TTL
+        self._beverage_cache.update((b["id"], (expires, b)) for b in beverages)
         return beverages
 
+    def get_all_beverages_json(self):
+        """
+        Retrieve all beverages as a JSON array string built by SQLite.
+
+        Skips per-row dict construction and Python-side serialization
+        entirely; the caller can splice the string straight into a
+        response body.
+
+        Returns:
+            str: A JSON array of beverage objects
+        """
+        return self.conn.execute(SQL_GET_ALL_BEVERAGES_JSON).fetchone()["payload"]
+
     def insert_beverage(self, name, caffeine_content_mg, image_url=None, category=None):
         """
         Insert a new beverage into the database.
@@ -264,11 +473,31 @@ class DatabaseDriver(object):
             int: The ID of the newly inserted beverage
         """
         cursor = self.conn.cursor()
-        cursor.execute("INSERT INTO beverages (name, caffeine_content_mg, image_url, category) VALUES (?, ?, ?, ?);",
+        cursor.execute(SQL_INSERT_BEVERAGE,
             (name, caffeine_content_mg, image_url, category))
         self.conn.commit()
         return cursor.lastrowid
 
+    def insert_beverages_bulk(self, rows):
+        """
+        Insert many beverages in one transaction (one commit, one fsync).
+
+        Intended for seeding the catalog; per-row insert_beverage calls
+        would pay one commit each.
+
+        Args:
+            rows (iterable): (name, caffeine_content_mg, image_url, category)
+                             tuples to insert
+
+        Returns:
+            int: The number of rows inserted
+        """
+        with self.conn:
+            cursor = self.conn.executemany(SQL_INSERT_BEVERAGE, rows)
+            inserted = cursor.rowcount
+        self.refresh_beverage_cache()
+        return inserted
+
     def get_beverage_by_id(self, id):
         """
         Retrieve a beverage by its ID.
@@ -280,16 +509,44 @@ class DatabaseDriver(object):
             dict or None: A dictionary containing beverage information if found,
                          None otherwise
         """
-        cursor = self.conn.execute("SELECT * FROM beverages WHERE id = ?;", (id,))
+        cached = self._beverage_cache_get(id)
+        if cached is not None:
+            return cached
+        beverage = self.conn.execute(SQL_GET_BEVERAGE_BY_ID, (id,)).fetchone()
+        if beverage is not None:
+            self._beverage_cache_put(beverage)
+        return beverage
+
+    def get_beverages_by_ids(self, ids):
+        """
+        Retrieve multiple beverages by their IDs in a single query.
+
+        Args:
+            ids (iterable): The beverage IDs to fetch
+
+        Returns:
+            dict: A mapping from beverage ID to a dictionary containing
+                  beverage information: id, name, caffeine_content_mg,
+                  image_url, category
+        """
+        beverages = {}
+        missing = []
+        # Dedupe up front so the IN-list only carries distinct ids
+        for id in set(ids):
+            cached = self._beverage_cache_get(id)
+            if cached is not None:
+                beverages[id] = cached
+            else:
+                missing.append(id)
+        if not missing:
+            return beverages
+        placeholders = ",".join("?" * len(missing))
+        cursor = self.conn.execute(f"SELECT id, name, caffeine_content_mg, image_url, category FROM beverages WHERE id IN ({placeholders});", tuple(missing))
         for row in cursor:
-            return {
-                "id": row[0],
-                "name": row[1],
-                "caffeine_content_mg": row[2],
-                "image_url": row[3],
-                "category": row[4]
-            }
-        return None
+            beverage = row
+            self._beverage_cache_put(beverage)
+            beverages[beverage["id"]] = beverage
+        return beverages
 
     def update_beverage_by_id(self, id, name, caffeine_content_mg, image_url=None, category=None):
         """
@@ -302,24 +559,73 @@ class DatabaseDriver(object):
             image_url (str, optional): New image URL. Defaults to None
             category (str, optional): New category. Defaults to None
         """
-        self.conn.execute("""
-            UPDATE beverages
-            SET name = ?, caffeine_content_mg = ?, image_url = ?, category = ?
-            WHERE id = ?;
-        """, (name, caffeine_content_mg, image_url, category, id))
+        self.conn.execute(SQL_UPDATE_BEVERAGE_BY_ID,
+            (name, caffeine_content_mg, image_url, category, id))
         self.conn.commit()
+        self._beverage_cache.pop(id, None)
+
+    def update_beverage_returning(self, id, name, caffeine_content_mg, image_url=None, category=None):
+        """
+        Update a beverage and return the updated row in a single round-trip
+        via UPDATE ... RETURNING.
+
+        Args:
+            id (int): The beverage's ID
+            name (str): New beverage name
+            caffeine_content_mg (int): New caffeine content in milligrams
+            image_url (str, optional): New image URL. Defaults to None
+            category (str, optional): New category. Defaults to None
+
+        Returns:
+            dict or None: The updated beverage if found, None otherwise
+        """
+        cursor = self.conn.execute(SQL_UPDATE_BEVERAGE_RETURNING,
+            (name, caffeine_content_mg, image_url, category, id))
+        row = cursor.fetchone()
+        self.conn.commit()
+        if row is None:
+            return None
+        beverage = row
+        self._beverage_cache_put(beverage)
+        return beverage
 
     def delete_beverage_by_id(self, id):
         """
-        Delete a beverage from the database by its ID.
-        
+        Delete a beverage by its ID and return the deleted row.
+
+        DELETE ... RETURNING reports the missing-row case in the same
+        round-trip, so callers don't need a SELECT before the delete.
+
         Args:
             id (int): The beverage's ID to delete
+
+        Returns:
+            dict: The deleted beverage, or None if no row matched
         """
-        self.conn.execute("DELETE FROM beverages WHERE id = ?;", (id,))
+        cursor = self.conn.execute(SQL_DELETE_BEVERAGE_BY_ID, (id,))
+        row = cursor.fetchone()
         self.conn.commit()
+        self._beverage_cache.pop(id, None)
+        if row is None:
+            return None
+        return row
+
+    def check_user_and_beverage(self, user_id, beverage_id):
+        """
+        Check that a user and a beverage both exist in one round-trip.
+
+        Args:
+            user_id (int): The user's ID
+            beverage_id (int): The beverage's ID
 
-    def insert_consumption(self, user_id, beverage_id, serving_count=1):
+        Returns:
+            tuple: (user_exists, beverage_exists) as booleans
+        """
+        cursor = self.conn.execute(SQL_CHECK_USER_AND_BEVERAGE, (user_id, beverage_id))
+        row = cursor.fetchone()
+        return row["u"] is not None, row["b"] is not None
+
+    def insert_consumption(self, user_id, beverage_id, serving_count=1, idempotency_key=None):
         """
         Insert a new consumption log entry.
         
@@ -327,16 +633,65 @@ class DatabaseDriver(object):
             user_id (int): The ID of the user who consumed the beverage
             beverage_id (int): The ID of the beverage consumed
             serving_count (int, optional): Number of servings consumed. Defaults to 1
+            idempotency_key (str, optional): Client-supplied replay token;
+                a retried request with the same key inserts nothing
         
         Returns:
-            int: The ID of the newly inserted consumption log entry
+            int: The ID of the newly inserted consumption log entry, or
+                 None if the idempotency key was already used
         """
         cursor = self.conn.cursor()
-        cursor.execute("INSERT INTO consumption_log (user_id, beverage_id, serving_count) VALUES (?, ?, ?);",
-            (user_id, beverage_id, serving_count))
+        cursor.execute(SQL_INSERT_CONSUMPTION,
+            (user_id, beverage_id, serving_count, idempotency_key))
         self.conn.commit()
+        if cursor.rowcount == 0:
+            return None
         return cursor.lastrowid
 
+    def bulk_insert_consumptions(self, rows):
+        """
+        Insert many consumption log entries in one transaction via
+        executemany, so the batch pays a single commit instead of one
+        per row.
+
+        Args:
+            rows (list): Tuples of (user_id, beverage_id, serving_count,
+                         idempotency_key)
+
+        Returns:
+            int: The number of rows inserted; rows replaying an already
+                 used idempotency key are skipped and not counted
+        """
+        with self.conn:
+            cursor = self.conn.executemany(SQL_INSERT_CONSUMPTION, rows)
+            return cursor.rowcount
+
+    def iter_all_consumptions(self):
+        """
+        Iterate over all consumption log entries straight from the cursor,
+        without materializing the whole table in memory.
+
+        Yields:
+            dict: A dictionary containing consumption log information:
+                  id, user_id, beverage_id, consumption_time, serving_count
+        """
+        cursor = self.conn.execute(SQL_GET_ALL_CONSUMPTIONS)
+        while True:
+            rows = cursor.fetchmany(512)
+            if not rows:
+                break
+            yield from rows
+
+    def get_all_consumptions(self):
+        """
+        Retrieve all consumption log entries from the database.
+
+        Returns:
+            list: A list of dictionaries, each containing consumption log information:
+                  id, user_id, beverage_id, consumption_time, serving_count
+        """
+        return list(self.iter_all_consumptions())
+
     def get_consumption_by_user_id(self, user_id):
         """
         Retrieve all consumption log entries for a specific user.
@@ -348,17 +703,8 @@ class DatabaseDriver(object):
             list: A list of dictionaries, each containing consumption log information:
                   id, user_id, beverage_id, consumption_time, serving_count
         """
-        cursor = self.conn.execute("SELECT * FROM consumption_log WHERE user_id = ?;", (user_id,))
-        consumptions = []
-        for row in cursor:
-            consumptions.append({
-                "id": row[0],
-                "user_id": row[1],
-                "beverage_id": row[2],
-                "consumption_time": row[3],
-                "serving_count": row[4]
-            })
-        return consumptions
+        cursor = self.conn.execute(SQL_GET_CONSUMPTION_BY_USER, (user_id,))
+        return cursor.fetchall()
 
     def get_consumption_by_user_and_date(self, user_id, date):
         """
@@ -372,17 +718,53 @@ class DatabaseDriver(object):
             list: A list of dictionaries, each containing consumption log information:
                   id, user_id, beverage_id, consumption_time, serving_count
         """
-        cursor = self.conn.execute("SELECT * FROM consumption_log WHERE user_id = ? AND DATE(consumption_time) = ?;", (user_id, date))
-        consumptions = []
-        for row in cursor:
-            consumptions.append({
-                "id": row[0],
-                "user_id": row[1],
-                "beverage_id": row[2],
-                "consumption_time": row[3],
-                "serving_count": row[4]
-            })
-        return consumptions
+        cursor = self.conn.execute(SQL_GET_CONSUMPTION_BY_USER_AND_DATE, (user_id, date, date))
+        return cursor.fetchall()
+
+    def get_weekly_totals(self, user_id, start_date):
+        """
+        Compute a user's per-day caffeine totals from start_date onward,
+        grouped by date in SQL.
+
+        Args:
+            user_id (int): The user's ID
+            start_date (str): The first date in 'YYYY-MM-DD' format
+
+        Returns:
+            dict: A mapping from 'YYYY-MM-DD' date to total caffeine in mg
+        """
+        cursor = self.conn.execute(SQL_GET_WEEKLY_TOTALS, (user_id, start_date))
+        return {row["day"]: row["total"] for row in cursor}
+
+    def get_consumption_breakdown_by_user_and_date(self, user_id, date):
+        """
+        Retrieve a user's consumptions for a date joined with beverage details,
+        so callers don't need a per-row beverage lookup.
+
+        Args:
+            user_id (int): The user's ID
+            date (str): The date in 'YYYY-MM-DD' format
+
+        Returns:
+            list: A list of dictionaries, each containing:
+                  name, serving_count, caffeine_content_mg
+        """
+        cursor = self.conn.execute(SQL_GET_CONSUMPTION_BREAKDOWN, (user_id, date, date))
+        return cursor.fetchall()
+
+    def get_daily_total_caffeine(self, user_id, date):
+        """
+        Compute a user's total caffeine intake for a date in SQL.
+
+        Args:
+            user_id (int): The user's ID
+            date (str): The date in 'YYYY-MM-DD' format
+
+        Returns:
+            int: The total caffeine consumed that day in mg (0 if none)
+        """
+        cursor = self.conn.execute(SQL_GET_DAILY_TOTAL_CAFFEINE, (user_id, date, date))
+        return cursor.fetchone()["total"]
 
     def get_consumption_by_id(self, id):
         """
@@ -395,16 +777,7 @@ class DatabaseDriver(object):
             dict or None: A dictionary containing consumption log information if found,
                          None otherwise
         """
-        cursor = self.conn.execute("SELECT * FROM consumption_log WHERE id = ?;", (id,))
-        for row in cursor:
-            return {
-                "id": row[0],
-                "user_id": row[1],
-                "beverage_id": row[2],
-                "consumption_time": row[3],
-                "serving_count": row[4]
-            }
-        return None
+        return self.conn.execute(SQL_GET_CONSUMPTION_BY_ID, (id,)).fetchone()
 
     def update_consumption_by_id(self, id, serving_count):
         """
@@ -414,20 +787,32 @@ class DatabaseDriver(object):
             id (int): The consumption log entry's ID
             serving_count (int): New serving count
         """
-        self.conn.execute("UPDATE consumption_log SET serving_count = ? WHERE id = ?;", (serving_count, id))
+        self.conn.execute(SQL_UPDATE_CONSUMPTION_BY_ID, (serving_count, id))
         self.conn.commit()
 
-    def delete_consumption_by_id(self, id):
+    def delete_consumptions_by_user_id(self, user_id):
         """
-        Delete a consumption log entry by its ID.
-        
+        Delete all consumption log entries for a user in a single statement.
+
         Args:
-            id (int): The consumption log entry's ID to delete
+            user_id (int): The user's ID whose entries should be deleted
         """
-        self.conn.execute("DELETE FROM consumption_log WHERE id = ?;", (id,))
+        self.conn.execute(SQL_DELETE_CONSUMPTIONS_BY_USER, (user_id,))
         self.conn.commit()
 
+    def delete_consumption_by_id(self, id):
+        """
+        Delete a consumption log entry by its ID and return the deleted row.
 
-# Only <=1 instance of the database driver
-# exists within the app at all times
-DatabaseDriver = singleton(DatabaseDriver)
\ No newline at end of file
+        Args:
+            id (int): The consumption log entry's ID to delete
+
+        Returns:
+            dict: The deleted entry, or None if no row matched
+        """
+        cursor = self.conn.execute(SQL_DELETE_CONSUMPTION_BY_ID, (id,))
+        row = cursor.fetchone()
+        self.conn.commit()
+        if row is None:
+            return None
+        return row
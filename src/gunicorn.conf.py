@@ -0,0 +1,8 @@
+import os
+
+# Gunicorn config for the Caffeine Tracker app.
+# SQLite calls block in C, so threaded sync workers are used rather than
+# gevent ones (which can't cooperatively schedule around sqlite3).
+bind = "0.0.0.0:5000"
+workers = 2 * os.cpu_count() + 1
+threads = 4